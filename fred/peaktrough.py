@@ -19,12 +19,19 @@ TODO: Add labels to the plots
     Identify FRED code?
     Check margins:  http://matplotlib.org/api/pyplot_api.html#matplotlib.pyplot.tight_layout
 """
+import warnings
 from datetime import datetime
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from pandas.io.data import DataReader
 
+try:
+    from panelserver import find_cached
+    cached = find_cached()
+except ImportError:  # panelserver.py (repo root) isn't on the path
+    cached = None
+
 # legend control, subject to change
 # http://stackoverflow.com/questions/7125009/how-to-change-legend-size-with-matplotlib-pyplot
 params = {'legend.fontsize': 10,
@@ -32,12 +39,17 @@ params = {'legend.fontsize': 10,
 plt.rcParams.update(params)
 
 
-def chopseries(data, indices, periods=40):
+def chopseries(data, indices, periods=40, freq=None, how="mean"):
     """
     Takes a series and chops it into pieces starting with cyclical peaks.
     Formally, it turns it into a data frame starting at each peak index date
     and running for the number of periods specified (default is 40)
 
+    The series does not need to share the frequency of `indices`: each
+    peak is mapped to the first observation on or after the peak date.
+    See `align_cycles` for the details and for chopping many series at
+    once.
+
     Parameters
     ----------
     data : pd.Series
@@ -53,6 +65,14 @@ def chopseries(data, indices, periods=40):
         in each cycle. In other words, the function will attempt to keep
         `periods` items, starting at each date in indices
 
+    freq : string, optional(default=None)
+        A pandas frequency string. If given, the series is first
+        aggregated to this frequency. Passed directly to `align_cycles`
+
+    how : string, optional(default="mean")
+        How to aggregate when `freq` is given. Passed directly to
+        `align_cycles`
+
     Returns
     -------
     new_data : pd.DataFrame
@@ -60,24 +80,232 @@ def chopseries(data, indices, periods=40):
         started. The data is a subset of the original series passed into
         the function
     """
-    # Number or series to plot
-    n = len(indices)
-    c_names = ["%d cycle" % x.year for x in indices]
+    new_data = align_cycles({"data": data}, indices, periods=periods,
+                            freq=freq, how=how)["data"]
+
+    return new_data
+
+
+def align_cycles(data, indices, periods=40, freq=None, how="mean"):
+    """
+    Chop many series, possibly of different frequencies, into cycles
+    starting at each date in `indices` in a single batched operation.
 
-    new_data = pd.DataFrame(np.empty((periods, n)), columns=c_names)
+    All series are stacked into one flat array so that mapping peaks
+    onto each series' dates (with `np.searchsorted`), the optional
+    aggregation and the extraction of the cycles are each done once for
+    every series together instead of in a loop.
 
-    for num, date in enumerate(indices):
-        date_loc = data.index.get_loc(date)
-        try:
-            new_data[c_names[num]] = data.ix[date_loc:date_loc+periods].values
-        except:
-            the_values = data.ix[date_loc:].values
-            length = the_values.size
-            stupiddata = np.concatenate([the_values.squeeze(),
-                                        np.nan*np.ones(periods-length)])
-            new_data[c_names[num]] = stupiddata
+    Each peak is mapped to the first observation of a series on or
+    after the peak date, so quarterly peak dates line up with the first
+    month of the quarter for monthly data and with the first week ending
+    in the quarter for weekly data. Cycles whose peak comes before the
+    start of a series are all NaN.
 
-    return new_data
+    Parameters
+    ----------
+    data : dict or pd.DataFrame
+        A dict mapping series names to pd.Series (or single column
+        DataFrames) with a DatetimeIndex. A DataFrame is treated as a
+        dict of its columns, each cut to the rows between its first and
+        last observation that are on its own frequency, so series of
+        different frequencies can share one index while missing values
+        inside a series are kept as they would be in a dict
+
+    indices : pd.DatetimeIndex
+        A pandas DatetimeIndex where each item represents the beginning
+        of a cycle
+
+    periods : int, optional(default=40)
+        The maximum number of periods to retain in each cycle, measured
+        in the native frequency of each series (or in `freq` if given)
+
+    freq : string, optional(default=None)
+        A pandas frequency string such as "Q" or "M". If given, every
+        series is aggregated to this frequency (labelled by the start
+        of each period) before chopping, and the peak dates are moved to
+        the start of their period
+
+    how : string, optional(default="mean")
+        How to aggregate observations within a period when `freq` is
+        given. Acceptable values are "mean", "sum" and "last". Missing
+        values are ignored by "mean" and "sum"
+
+    Returns
+    -------
+    chopped : pd.DataFrame
+        A DataFrame with `periods` rows and a column MultiIndex of
+        (series name, cycle), where cycles are named for the year they
+        started as in `chopseries`
+
+    Examples
+    --------
+    >>> peaks = peak_begin_dates()
+    >>> data = {"GDPC1": DataReader("GDPC1", "fred", start="1972"),
+    ...         "PAYEMS": DataReader("PAYEMS", "fred", start="1972"),
+    ...         "ICSA": DataReader("ICSA", "fred", start="1972")}
+    >>> chopped = align_cycles(data, peaks, freq="Q")
+    """
+    if isinstance(data, pd.DataFrame):
+        data = dict((c, _native_rows(data[c])) for c in data.columns)
+
+    names = list(data.keys())
+    series = [data[k].sort_index() for k in names]
+    lengths = np.array([len(x) for x in series])
+    values = np.concatenate([np.asarray(x, dtype=float).reshape(len(x))
+                             for x in series])
+    dates = np.concatenate([np.asarray(x.index.values, dtype="datetime64[ns]")
+                            for x in series])
+    sid = np.repeat(np.arange(len(series)), lengths)
+    peaks = pd.DatetimeIndex(indices)
+
+    if freq is not None:
+        dates = pd.DatetimeIndex(dates).to_period(freq).to_timestamp().values
+        peaks = peaks.to_period(freq).to_timestamp()
+        sid, dates, values = _aggregate_periods(sid, dates, values, how)
+
+    # Segment boundaries of each series in the flat arrays
+    seg_end = np.cumsum(np.bincount(sid, minlength=len(series)))
+    seg_start = seg_end - np.bincount(sid, minlength=len(series))
+
+    # Sort key that orders by series, then date, so one searchsorted
+    # finds every peak in every series
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    peak_days = peaks.values.astype("datetime64[D]").astype(np.int64)
+    lo = min(days.min(), peak_days.min())
+    span = max(days.max(), peak_days.max()) - lo + 1
+    keys = sid * span + (days - lo)
+    peak_keys = (np.arange(len(series))[:, None] * span +
+                 (peak_days - lo)[None, :])
+    pos = np.searchsorted(keys, peak_keys, side="left")
+
+    # A peak that maps onto the first observation only counts if the
+    # series actually started by then
+    first = np.minimum(pos, len(keys) - 1)
+    started = (pos > seg_start[:, None]) | (keys[first] == peak_keys)
+
+    # (series, cycle, period) array of positions into the flat arrays
+    idx = pos[:, :, None] + np.arange(periods)
+    valid = (idx < seg_end[:, None, None]) & started[:, :, None]
+    chopped = np.where(valid, values[np.minimum(idx, len(values) - 1)],
+                       np.nan)
+
+    c_names = ["%d cycle" % x.year for x in pd.DatetimeIndex(indices)]
+    columns = pd.MultiIndex.from_product([names, c_names])
+    chopped = chopped.reshape(-1, periods).T
+
+    return pd.DataFrame(chopped, columns=columns)
+
+
+def _aggregate_periods(sid, dates, values, how):
+    """
+    Collapse consecutive observations that share a series id and
+    (period start) date. Arrays must be sorted by series, then date.
+    """
+    new = np.concatenate([[True], (sid[1:] != sid[:-1]) |
+                                  (dates[1:] != dates[:-1])])
+    starts = np.flatnonzero(new)
+    ends = np.concatenate([starts[1:], [len(values)]])
+
+    if how == "last":
+        agg = values[ends - 1]
+    elif how in ("mean", "sum"):
+        missing = np.isnan(values)
+        counts = np.add.reduceat(~missing, starts)
+        sums = np.add.reduceat(np.where(missing, 0.0, values), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            agg = sums / counts if how == "mean" else sums
+        agg[counts == 0] = np.nan
+    else:
+        raise ValueError("how must be one of 'mean', 'sum' or 'last'")
+
+    return sid[starts], dates[starts], agg
+
+
+def _download_fred(fred_series, start="01/01/1972"):
+    return DataReader(fred_series, "fred", start=start)
+
+
+def read_fred(fred_series, start="01/01/1972"):
+    """
+    Get the series `fred_series` from FRED, starting at `start`.
+
+    If a panel server is running (see `panelserver.py` at the root of
+    the repository) and the NYUECON_PANELSERVER environment variable
+    points at it, the data comes from the server's in-memory cache.
+    Otherwise it is downloaded from FRED
+
+    Parameters
+    ----------
+    fred_series : string
+        A string representing the fred dataset identifier.
+
+    start : string or datetime.datetime, optional(default='01/01/1972')
+        A string or other acceptable pandas date identifier that marks
+        the first date to get
+
+    Returns
+    -------
+    fred_data : pd.DataFrame
+        The data, with a DatetimeIndex
+    """
+    if cached is None:
+        return _download_fred(fred_series, start=start)
+
+    return cached("fred", _download_fred, fred_series, start=start)
+
+
+def _native_rows(col):
+    """
+    Keep the rows of a DataFrame column that belong to the series: those
+    between its first and last observation whose dates are on the
+    frequency of its observed dates. Falls back on dropping only
+    leading and trailing missing values if the frequency can't be
+    inferred
+    """
+    obs = col.dropna().index
+    if len(obs) == 0:
+        return col.iloc[:0]
+    col = col.loc[obs[0]:obs[-1]]
+
+    # gaps make the whole index irregular, so also try short windows
+    freq = _infer_freq(obs)
+    for k in range(len(obs) - 2):
+        if freq is not None:
+            break
+        freq = _infer_freq(obs[k:k + 3])
+    if freq is None:
+        return col
+
+    grid = pd.date_range(obs[0], obs[-1], freq=freq)
+    return col[col.index.isin(grid)]
+
+
+def _infer_freq(index):
+    """
+    Return the pandas frequency string of a DatetimeIndex, or None if it
+    can't be inferred
+    """
+    try:
+        return pd.infer_freq(pd.DatetimeIndex(index))
+    except (TypeError, ValueError):
+        return None
+
+
+def _period_name(freq):
+    """
+    Name the periods of a pandas frequency string, e.g. "Quarters" for
+    "Q" or "QS-OCT". Falls back on "Periods"
+    """
+    names = {"A": "Years", "Y": "Years", "Q": "Quarters", "M": "Months",
+             "W": "Weeks", "D": "Days", "B": "Days"}
+    if not freq:
+        return "Periods"
+
+    freq = freq.upper()
+    if freq.startswith("B") and len(freq) > 1:  # business quarters etc.
+        freq = freq[1:]
+    return names.get(freq[0], "Periods")
 
 
 def peak_begin_dates(start="01/01/1972", end=datetime.now()):
@@ -102,7 +330,7 @@ def peak_begin_dates(start="01/01/1972", end=datetime.now()):
         "peak" from start to end
     """
     # Get quarterly recession dates from FRED
-    rec_dates = DataReader("USRECQ", "fred", start=start)
+    rec_dates = read_fred("USRECQ", start=start)
     one_vals = np.where(rec_dates == 1)[0]
     rec_start = [one_vals[0]]
 
@@ -119,7 +347,8 @@ def peak_begin_dates(start="01/01/1972", end=datetime.now()):
 
 def manhandle_freddata(fred_series, nperiods=40,
                        changetype="log", start="01/01/1972",
-                       saveshow="show", **plot_kwargs):
+                       saveshow="show", fred_data=None, freq=None,
+                       how="mean", bands=None, seed=0, **plot_kwargs):
     """
     This function takes a string that corresponds to a data series from
     FRED and creates a DataFrame that takes this series and creates a
@@ -159,6 +388,34 @@ def manhandle_freddata(fred_series, nperiods=40,
         shown. Optional parameter, default is to save them. Acceptable
         values are "save", "show", and "both".
 
+    fred_data : pd.Series or pd.DataFrame, optional(default=None)
+        The data to use instead of downloading `fred_series` from FRED,
+        for example a historical vintage from `vintages.VintageStore`.
+        Index should be a DatetimeIndex. `fred_series` is then only used
+        to label the plot
+
+    freq : string, optional(default=None)
+        A pandas frequency string. If given, the data are aggregated to
+        this frequency before being chopped into cycles, so monthly or
+        weekly series can be compared with quarterly ones. Passed
+        directly to the `chopseries` function
+
+    how : string, optional(default="mean")
+        How to aggregate when `freq` is given. Acceptable values are
+        "mean", "sum" and "last". Passed directly to the `chopseries`
+        function
+
+    bands : string, optional(default=None)
+        If given, shade a band summarizing the historical cycles (all
+        but the current one) behind the plot. Acceptable values are
+        "cycles" (10th to 90th percentile across cycles around their
+        median) and "bootstrap" (90 percent bootstrap band for the
+        median path). See `cycle_bands`
+
+    seed : int, optional(default=0)
+        Seed for the bootstrap when bands="bootstrap", so the same data
+        always gives the same figure
+
     plot_kwargs : other
         Other keyword arguments that will be passed directly to the
         `pd.DataFrame.plot` method when generating the plot. See pandas
@@ -177,26 +434,27 @@ def manhandle_freddata(fred_series, nperiods=40,
     For more examples see the `examples.ipynb` notebook in this
     directory.
     """
-    # Get data
-    fred_data = DataReader(fred_series, "fred", start=start)
-
-    # Get dates for start of peak
-    peak_dates = peak_begin_dates(start=start)
-
-    # Break the time-series into chunks for each recession
-    chopped_data = chopseries(fred_data, peak_dates, periods=nperiods)
-
-    # Compute percent changes.
-    if changetype.lower() == "percent":
-        pct_change = ((chopped_data / chopped_data.iloc[0] - 1)*100)
-    elif changetype.lower() == "log":
-        logged = np.log(chopped_data)
-        pct_change = (logged - logged.iloc[0]) * 100.0
+    if bands not in (None, "cycles", "bootstrap"):
+        raise ValueError("bands must be None, 'cycles' or 'bootstrap'")
+
+    # Get data, break it into chunks for each recession and compute
+    # percent changes
+    if fred_data is None:
+        pct_change = cycle_panel(fred_series, nperiods=nperiods,
+                                 changetype=changetype, start=start,
+                                 freq=freq, how=how)
+    else:
+        pct_change = _cycle_panel(fred_data, peak_begin_dates(start=start),
+                                  nperiods, changetype, freq, how)
 
     # plot data
     fig, (ax) = plt.subplots(1, 1)
     ax.set_ylabel("Percent change from previous peak")
-    pct_change.index.name = "Quarters since previous peak"  # becomes x_label
+    if bands == "bootstrap":
+        plot_cycle_bands(ax, cycle_bands(pct_change, n_boot=1000,
+                                         percentiles=(5, 95), seed=seed))
+    elif bands == "cycles":
+        plot_cycle_bands(ax, cycle_bands(pct_change))
     pct_change.plot(ax=ax, **plot_kwargs)
     ax.legend_.set_title("FRED: " + fred_series)  # set title on legend
 
@@ -213,6 +471,301 @@ def manhandle_freddata(fred_series, nperiods=40,
     return pct_change
 
 
+def _cycle_panel(fred_data, peak_dates, nperiods, changetype, freq, how):
+    """
+    Chop fred_data at peak_dates and compute percent changes. The index
+    is named for the periods on the x axis, e.g. "Quarters since
+    previous peak"
+    """
+    chopped_data = chopseries(fred_data, peak_dates, periods=nperiods,
+                              freq=freq, how=how)
+    pct_change = cycle_pct_change(chopped_data, changetype=changetype)
+    pct_change.index.name = "%s since previous peak" % _period_name(
+        freq if freq is not None else _infer_freq(fred_data.index))
+
+    return pct_change
+
+
+def _download_cycle_panel(fred_series, nperiods=40, changetype="log",
+                          start="01/01/1972", freq=None, how="mean"):
+    return _cycle_panel(read_fred(fred_series, start=start),
+                        peak_begin_dates(start=start), nperiods, changetype,
+                        freq, how)
+
+
+def cycle_panel(fred_series, nperiods=40, changetype="log",
+                start="01/01/1972", freq=None, how="mean"):
+    """
+    The percent change from the beginning of each business cycle of the
+    FRED series `fred_series`, as plotted by `manhandle_freddata`.
+
+    If a panel server is running (see `panelserver.py` at the root of
+    the repository) and the NYUECON_PANELSERVER environment variable
+    points at it, the panel comes from the server's in-memory cache.
+
+    Parameters
+    ----------
+    fred_series : string
+        A string representing the fred dataset identifier.
+
+    nperiods, changetype, start, freq, how : optional
+        See `manhandle_freddata`
+
+    Returns
+    -------
+    pct_change : pd.DataFrame
+        The pandas DataFrame representing the percent change from the
+        beginning of each peak, extended out `nperiods`
+    """
+    kwargs = dict(nperiods=nperiods, changetype=changetype, start=start,
+                  freq=freq, how=how)
+    if cached is None:
+        return _download_cycle_panel(fred_series, **kwargs)
+
+    return cached("cycle_panel", _download_cycle_panel, fred_series, **kwargs)
+
+
+def cycle_pct_change(chopped_data, changetype="log"):
+    """
+    Compute the percent change of each cycle relative to its first
+    (peak) observation.
+
+    Parameters
+    ----------
+    chopped_data : pd.DataFrame
+        A DataFrame like the one returned by `chopseries`, with one
+        column per cycle. Columns may also be a MultiIndex of
+        (series, cycle) so many series can be handled at once
+
+    changetype : string, optional(default="log")
+        A string identifying how the percentage change should be
+        computed. Acceptable values are `percent` or `log`
+
+    Returns
+    -------
+    pct_change : pd.DataFrame
+        The percent change from the beginning of each cycle. Has the
+        same shape, index and columns as `chopped_data`
+    """
+    if changetype.lower() == "percent":
+        pct_change = ((chopped_data / chopped_data.iloc[0] - 1)*100)
+    elif changetype.lower() == "log":
+        logged = np.log(chopped_data)
+        pct_change = (logged - logged.iloc[0]) * 100.0
+    else:
+        raise ValueError("changetype must be either 'percent' or 'log'")
+
+    return pct_change
+
+
+def cycle_metrics(pct_change):
+    """
+    Compute summary statistics for every cycle in a percent change
+    panel in one pass. All of the work is done with NumPy reductions
+    over the whole panel, so it is cheap to call on thousands of
+    series at once.
+
+    The statistics computed for each column are
+
+    * depth : the lowest value reached (percent change from peak)
+    * time_to_trough : periods from the peak to the lowest value
+    * time_to_recovery : periods from the peak until the series is
+      first back at or above its peak level, on or after the trough.
+      NaN if the series never recovers within the window
+    * cumulative_loss : the sum of the (negative) percent changes from
+      the peak until recovery, or until the end of the window if the
+      series never recovers. Measured in percent-periods
+    * nobs : the number of non-missing observations in the cycle
+
+    Parameters
+    ----------
+    pct_change : pd.DataFrame
+        A DataFrame like the one returned by `manhandle_freddata` or
+        `cycle_pct_change`, where rows are periods since the peak and
+        each column is one cycle. Columns may be a MultiIndex of
+        (series, cycle).
+
+    Returns
+    -------
+    metrics : pd.DataFrame
+        A DataFrame with one row per column of `pct_change` and one
+        column per statistic. Sort on any column to rank cycles, e.g.
+        `metrics.sort_values("depth")`
+
+    Examples
+    --------
+    >>> rgdp = manhandle_freddata('GDPC1')
+    >>> cycle_metrics(rgdp)
+    """
+    values = np.asarray(pct_change, dtype=float)
+    nper, ncols = values.shape
+    missing = np.isnan(values)
+    has_data = ~missing.all(axis=0)
+    periods = np.arange(nper)[:, None]
+
+    # nanargmin raises on all-NaN columns, so do its job by hand
+    trough = np.argmin(np.where(missing, np.inf, values), axis=0)
+    depth = values[trough, np.arange(ncols)]
+
+    # `recovered` turns on (and stays on) at the first period on or after
+    # the trough where we are back at the peak level
+    crossed = (values >= 0) & (periods >= trough)
+    recovered = np.maximum.accumulate(crossed, axis=0)
+    ever_recovered = recovered[-1]
+    recovery = np.argmax(crossed, axis=0).astype(float)
+    recovery[~ever_recovered] = np.nan
+
+    # Only losses accumulated before recovery count
+    losses = np.where(missing | recovered, 0.0, np.minimum(values, 0.0))
+    cum_loss = losses.sum(axis=0)
+
+    metrics = pd.DataFrame({"depth": depth,
+                            "time_to_trough": trough.astype(float),
+                            "time_to_recovery": recovery,
+                            "cumulative_loss": cum_loss,
+                            "nobs": (~missing).sum(axis=0)},
+                           index=pct_change.columns,
+                           columns=["depth", "time_to_trough",
+                                    "time_to_recovery", "cumulative_loss",
+                                    "nobs"])
+    metrics.loc[~has_data, ["depth", "time_to_trough",
+                            "time_to_recovery", "cumulative_loss"]] = np.nan
+
+    return metrics
+
+
+def cycle_bands(pct_change, center="median", percentiles=(10, 90),
+                n_boot=0, exclude_current=True, seed=None):
+    """
+    Summarize the distribution of paths across historical cycles: a
+    central path (mean or median across cycles) and a band around it.
+
+    Without the bootstrap the band is given by NaN-aware percentiles of
+    the cycles themselves at each period. With the bootstrap, cycles are
+    resampled with replacement `n_boot` times, the central path is
+    computed for every draw, and the band is a single `np.nanpercentile`
+    over the resulting (series, period, draw) array, giving a confidence
+    band for the central path.
+
+    Parameters
+    ----------
+    pct_change : pd.DataFrame
+        A DataFrame like the one returned by `manhandle_freddata` or
+        `cycle_pct_change` with one column per cycle, in date order.
+        Columns may be a MultiIndex of (series, cycle) to handle many
+        series in one call
+
+    center : string, optional(default="median")
+        The central path. Acceptable values are "median" or "mean"
+
+    percentiles : tuple(float, float), optional(default=(10, 90))
+        The lower and upper percentiles of the band
+
+    n_boot : int, optional(default=0)
+        The number of bootstrap draws. If 0, the band is computed from
+        the percentiles across cycles instead. Series are resampled in
+        chunks, so memory use doesn't grow with the number of series
+
+    exclude_current : bool, optional(default=True)
+        Whether to leave out the last (current) cycle of each series
+
+    seed : int, optional(default=None)
+        Seed for the random number generator used by the bootstrap
+
+    Returns
+    -------
+    bands : pd.DataFrame
+        A DataFrame with the same index as `pct_change` and columns
+        "center", "lower" and "upper". If `pct_change` has MultiIndex
+        columns, the columns are a MultiIndex of (series, stat)
+    """
+    if center == "median":
+        func = np.nanmedian
+    elif center == "mean":
+        func = np.nanmean
+    else:
+        raise ValueError("center must be either 'median' or 'mean'")
+
+    multi = isinstance(pct_change.columns, pd.MultiIndex)
+    if multi:
+        names = pct_change.columns.get_level_values(0).unique()
+        cycles = pct_change.columns.get_level_values(1).unique()
+        pct_change = pct_change.reindex(
+            columns=pd.MultiIndex.from_product([names, cycles]))
+    else:
+        names, cycles = ["data"], pct_change.columns
+
+    # (series, period, cycle)
+    nper = pct_change.shape[0]
+    values = np.asarray(pct_change, dtype=float)
+    values = values.reshape(nper, len(names), len(cycles)).transpose(1, 0, 2)
+    if exclude_current:
+        values = values[:, :, :-1]
+    ncyc = values.shape[2]
+
+    with warnings.catch_warnings():
+        # all-NaN slices just give NaN, which is what we want
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mid = func(values, axis=2)
+        if n_boot > 0:
+            rng = np.random.RandomState(seed)
+            draws = rng.randint(0, ncyc, size=(n_boot, ncyc))
+
+            # resample a chunk of series at a time so the
+            # (series, period, draw, cycle) array stays around 2**24
+            # elements (128MB)
+            step = max(1, 2 ** 24 // max(1, nper * n_boot * ncyc))
+            lower, upper = np.empty((2,) + mid.shape)
+            for i in range(0, len(names), step):
+                boot = func(values[i:i + step][:, :, draws], axis=3)
+                lower[i:i + step], upper[i:i + step] = \
+                    np.nanpercentile(boot, percentiles, axis=2)
+        else:
+            lower, upper = np.nanpercentile(values, percentiles, axis=2)
+
+    # (series, stat, period) -> (period, series * stat)
+    out = np.array([mid, lower, upper]).transpose(2, 1, 0)
+    out = out.reshape(nper, -1)
+    if multi:
+        columns = pd.MultiIndex.from_product([names,
+                                              ["center", "lower", "upper"]])
+    else:
+        columns = ["center", "lower", "upper"]
+
+    return pd.DataFrame(out, index=pct_change.index, columns=columns)
+
+
+def plot_cycle_bands(ax, bands, color="0.6", alpha=0.4):
+    """
+    Draw the central path and band from `cycle_bands` for one series on
+    the matplotlib axis `ax`
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        The axis to draw on
+
+    bands : pd.DataFrame
+        A DataFrame with columns "center", "lower" and "upper", as
+        returned by `cycle_bands` for a single series
+
+    color : string, optional(default="0.6")
+        Any matplotlib color for the band
+
+    alpha : float, optional(default=0.4)
+        Transparency of the band
+
+    Returns
+    -------
+    None
+    """
+    x = np.asarray(bands.index)
+    ax.fill_between(x, bands["lower"].values, bands["upper"].values,
+                    color=color, alpha=alpha, linewidth=0)
+    ax.plot(x, bands["center"].values, color='k', linestyle="--",
+            linewidth=1.5)
+
+
 if __name__ == '__main__':
     # Get Real GDP, Real Personal Consumption, Nonresidential Investment,
     # and Output per Hour from FRED
@@ -0,0 +1,21 @@
+import os
+import pandas as pd
+
+from vintages import VintageStore, synthetic_vintages
+
+
+def test_as_of_round_trip(tmpdir):
+    vintages = synthetic_vintages()
+    store = VintageStore()
+    store.add_series("SYNTH", vintages)
+    fn = os.path.join(str(tmpdir), "vintages.npz")
+    store.save(fn)
+    loaded = VintageStore.load(fn)
+
+    for s in [store, loaded]:
+        assert s.names == ["SYNTH"]
+        for col in vintages.columns:
+            expected = vintages[col].dropna().rename("SYNTH")
+            pd.testing.assert_series_equal(s.as_of("SYNTH", col), expected,
+                                           check_freq=False,
+                                           check_index_type=False)
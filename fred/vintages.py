@@ -0,0 +1,232 @@
+"""
+Compact storage of historical vintages of FRED series for real-time
+analysis.
+
+Each series is stored as the values of its first vintage plus, for
+every later vintage, only the observations that were revised (or newly
+published). The series "as of" any date is rebuilt by replaying the
+revisions up to that date, which only touches the revised entries.
+
+The store can be fed from ALFRED-style frames, where the index holds
+observation dates and each column holds one vintage, and the output of
+`VintageStore.as_of` can be passed straight to `chopseries` or to
+`manhandle_freddata` through its `fred_data` argument:
+
+    >>> store = VintageStore()
+    >>> store.add_series("GDPC1", alfred_frame)
+    >>> gdp_2008 = store.as_of("GDPC1", "2008-12-01")
+    >>> manhandle_freddata("GDPC1", fred_data=gdp_2008)
+
+"""
+import numpy as np
+import pandas as pd
+
+_FIELDS = ["dates", "vintages", "nobs", "base", "offsets", "positions",
+           "values"]
+
+
+class VintageStore(object):
+    """
+    A collection of delta-encoded vintages for one or more series.
+
+    For each series we keep
+
+    * dates : every observation date that appears in any vintage
+    * vintages : the (sorted) dates each vintage was released
+    * nobs : the number of observation dates covered by each vintage
+    * base : the values of the first vintage, aligned on `dates`
+    * offsets : `positions[:offsets[i]]` are the revisions made by
+      vintages 1 through i
+    * positions, values : the flattened revisions themselves
+    """
+    def __init__(self):
+        self._series = {}
+
+    @property
+    def names(self):
+        return sorted(self._series.keys())
+
+    def vintage_dates(self, name):
+        """
+        Return the release dates of every vintage of series `name`
+        """
+        return pd.DatetimeIndex(self._series[name]["vintages"])
+
+    def add_series(self, name, vintages):
+        """
+        Delta-encode the vintages of a series and add them to the store.
+
+        Parameters
+        ----------
+        name : string
+            The identifier of the series, e.g. the FRED code
+
+        vintages : pd.DataFrame or dict
+            Either a DataFrame with a DatetimeIndex of observation dates
+            and one column per vintage (columns are the vintage release
+            dates), or a dict mapping vintage release dates to pd.Series
+            indexed by observation date
+
+        Returns
+        -------
+        None
+        """
+        if isinstance(vintages, dict):
+            vintages = pd.DataFrame(vintages)
+
+        vintages = vintages.sort_index()
+        vintages.columns = pd.DatetimeIndex(vintages.columns)
+        vintages = vintages.sort_index(axis=1)
+
+        # rows are vintages, columns are observation dates
+        dense = vintages.values.T.astype(float)
+        obs = ~np.isnan(dense)
+        if not obs.any(axis=1).all():
+            raise ValueError("Every vintage of %s needs at least one "
+                             "observation" % name)
+
+        # number of dates covered by each vintage: up to its last value
+        last = dense.shape[1] - np.argmax(obs[:, ::-1], axis=1)
+
+        # an entry is a revision if it differs from the previous vintage,
+        # counting NaN -> value and value -> NaN as changes too
+        prev, cur = dense[:-1], dense[1:]
+        same = (prev == cur) | (np.isnan(prev) & np.isnan(cur))
+        which, positions = np.nonzero(~same)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(
+            which, minlength=dense.shape[0] - 1))])
+
+        self._series[name] = {
+            "dates": vintages.index.values.astype("datetime64[ns]"),
+            "vintages": vintages.columns.values.astype("datetime64[ns]"),
+            "nobs": last,
+            "base": dense[0].copy(),
+            "offsets": offsets,
+            "positions": positions,
+            "values": cur[which, positions]}
+
+    def as_of(self, name, date):
+        """
+        Reconstruct series `name` as it was known on `date`.
+
+        Parameters
+        ----------
+        name : string
+            The identifier of the series
+
+        date : string or datetime.datetime
+            Any date that pandas understands. The most recent vintage
+            released on or before this date is returned
+
+        Returns
+        -------
+        data : pd.Series
+            The series as of `date`, indexed by observation date
+        """
+        s = self._series[name]
+        date = np.datetime64(pd.Timestamp(date), "ns")
+        k = np.searchsorted(s["vintages"], date, side="right") - 1
+        if k < 0:
+            raise ValueError("No vintage of %s was released on or before %s"
+                             % (name, date))
+
+        values = s["base"].copy()
+        end = s["offsets"][k]
+        if end > 0:
+            # replay revisions; when a date was revised more than once
+            # only its most recent revision should survive
+            pos = s["positions"][:end][::-1]
+            pos, first = np.unique(pos, return_index=True)
+            values[pos] = s["values"][:end][::-1][first]
+
+        n = s["nobs"][k]
+        return pd.Series(values[:n], index=pd.DatetimeIndex(s["dates"][:n]),
+                         name=name)
+
+    def save(self, fn):
+        """
+        Save the store to the compressed numpy file `fn`
+        """
+        arrays = {}
+        for name, s in self._series.items():
+            for field in _FIELDS:
+                arrays[name + "/" + field] = s[field]
+        np.savez_compressed(fn, **arrays)
+
+    @classmethod
+    def load(cls, fn):
+        """
+        Load a store previously written with `VintageStore.save`
+        """
+        store = cls()
+        with np.load(fn) as f:
+            for key in f.files:
+                name, field = key.rsplit("/", 1)
+                store._series.setdefault(name, {})[field] = f[key]
+        return store
+
+
+def synthetic_vintages(start="01/01/1972", nobs=160, nvintages=40,
+                       freq="QS", seed=42):
+    """
+    Build a synthetic ALFRED-style set of vintages for testing and
+    examples.
+
+    The underlying series is a random walk in logs. Every vintage adds
+    one new observation and revises the three most recent ones, and
+    every tenth vintage is a "benchmark" revision that rescales the
+    whole history.
+
+    Parameters
+    ----------
+    start : string or datetime.datetime, optional(default='01/01/1972')
+        The first observation date
+
+    nobs : int, optional(default=160)
+        The number of observations in the latest vintage
+
+    nvintages : int, optional(default=40)
+        The number of vintages to generate
+
+    freq : string, optional(default="QS")
+        A pandas frequency string for the observation dates. Each vintage
+        is released one month after the start of the period that follows
+        its last observation, i.e. a month after that observation's
+        period ends for start-of-period frequencies like the default
+
+    seed : int, optional(default=42)
+        Seed for the random number generator
+
+    Returns
+    -------
+    vintages : pd.DataFrame
+        A DataFrame indexed by observation date with one column per
+        vintage release date
+    """
+    rng = np.random.RandomState(seed)
+    # one extra date so that bounds[i + 1] is where period i ends
+    bounds = pd.date_range(start, periods=nobs + 1, freq=freq)
+    dates = bounds[:-1]
+    truth = 100 * np.exp(np.cumsum(0.008 + 0.01 * rng.randn(nobs)))
+
+    first = nobs - nvintages + 1
+    cols = {}
+    for v in range(nvintages):
+        n = first + v
+        vals = truth[:n].copy()
+        vals[-3:] *= 1 + 0.002 * rng.randn(min(3, n))
+        if v > 0 and v % 10 == 0:
+            truth *= 1 + 0.001 * rng.randn()
+        vals = np.concatenate([vals, np.nan * np.ones(nobs - n)])
+        # released a month after the last observation period ends
+        cols[bounds[n] + pd.DateOffset(months=1)] = vals
+
+    return pd.DataFrame(cols, index=dates)
+
+
+if __name__ == '__main__':
+    store = VintageStore()
+    store.add_series("SYNTH", synthetic_vintages())
+    for d in store.vintage_dates("SYNTH")[::10]:
+        s = store.as_of("SYNTH", d)
+        print("%s: %d obs, last value %.2f" % (d.date(), s.size, s.iloc[-1]))
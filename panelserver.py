@@ -0,0 +1,488 @@
+"""
+A small local server that keeps decoded data in memory so notebooks and
+report jobs don't reload it from disk or the network every time.
+
+The server caches FRED series, business cycle panels (see
+`fred/peaktrough.py`) and PSID column sets (see `psid/psid.py`) in a
+least recently used cache bounded by the number of bytes it holds, and
+sends them back as NumPy (`.npz`) buffers, or Arrow IPC streams if
+pyarrow is installed.
+
+Start the server from the root of the repository
+
+    python panelserver.py --port 8765 --max-mb 2048 --psid-store ~/PSID
+
+and point clients at it with an environment variable
+
+    export NYUECON_PANELSERVER=http://127.0.0.1:8765
+
+With the variable set, `manhandle_freddata`, `cycle_panel`,
+`peak_begin_dates` and the `psid_analysis` loaders fetch their data
+through the server, and fall back to loading it themselves if the
+server can't be reached. They import this module, so the root of the
+repository must be on the python path, e.g.
+
+    export PYTHONPATH=/path/to/NYUecondata
+
+PSID entries are cached together with the fingerprint of their wave in
+the store's catalog, so a wave that is rewritten with `psid.write_wave`
+is reloaded on the next request. Clients send the path of the store
+they would read themselves, and the server refuses (so the client loads
+locally) if it isn't the one given to `--psid-store`.
+
+FRED series, peak dates and cycle panels are reloaded once they are
+older than `--fred-ttl` seconds (six hours by default), so new releases
+show up without restarting the server.
+
+The server only listens on localhost.
+"""
+import io
+import os
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from urllib.request import urlopen, Request
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ENV_VAR = "NYUECON_PANELSERVER"
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+#  -------------- #
+#  Serialization  #
+#  -------------- #
+
+def _index_array(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return np.asarray(index.values, dtype="datetime64[ns]")
+    values = np.asarray(index)
+    if values.dtype.kind in "biuf":
+        return values
+    return values.astype(str)
+
+
+def encode(obj, fmt="npz"):
+    """
+    Turn a pd.DataFrame, pd.Series or pd.DatetimeIndex into bytes.
+
+    Parameters
+    ----------
+    obj : pd.DataFrame, pd.Series or pd.DatetimeIndex
+        The object to encode. DataFrame columns may be a MultiIndex
+
+    fmt : string, optional(default="npz")
+        Either "npz" for a NumPy archive with one array per column or
+        "arrow" for an Arrow IPC stream (requires pyarrow)
+
+    Returns
+    -------
+    buf : bytes
+        The encoded object
+    """
+    if isinstance(obj, pd.DatetimeIndex):
+        kind, df = "index", pd.DataFrame(index=obj)
+    elif isinstance(obj, pd.Series):
+        kind, df = "series", obj.to_frame()
+    else:
+        kind, df = "frame", obj
+
+    if fmt == "arrow":
+        if pa is None:
+            raise ValueError("pyarrow is needed for the arrow format")
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata(dict(
+            table.schema.metadata, nyuecon_kind=kind))
+        sink = pa.BufferOutputStream()
+        writer = pa.ipc.new_stream(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+        return sink.getvalue().to_pybytes()
+
+    if fmt != "npz":
+        raise ValueError("fmt must be either 'npz' or 'arrow'")
+
+    columns = df.columns
+    if not isinstance(columns, pd.MultiIndex):
+        columns = pd.MultiIndex.from_arrays([columns])
+
+    meta = {"kind": kind, "ncols": df.shape[1],
+            "nlevels": columns.nlevels, "index_name": df.index.name}
+    arrays = {"index": _index_array(df.index)}
+    for i in range(columns.nlevels):
+        arrays["columns_%d" % i] = _index_array(
+            columns.get_level_values(i))
+    for i in range(df.shape[1]):
+        arrays["col_%d" % i] = np.asarray(df.iloc[:, i].values)
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def decode(buf, fmt="npz"):
+    """
+    Inverse of `encode`
+    """
+    if fmt == "arrow":
+        table = pa.ipc.open_stream(buf).read_all()
+        kind = table.schema.metadata[b"nyuecon_kind"].decode()
+        df = table.to_pandas()
+    else:
+        with np.load(io.BytesIO(buf)) as f:
+            meta = json.loads(f["meta"].tobytes().decode())
+            kind = meta["kind"]
+            levels = [f["columns_%d" % i] for i in range(meta["nlevels"])]
+            if meta["nlevels"] == 1:
+                columns = pd.Index(levels[0])
+            else:
+                columns = pd.MultiIndex.from_arrays(levels)
+            df = pd.DataFrame(dict((i, f["col_%d" % i])
+                                   for i in range(meta["ncols"])),
+                              index=f["index"],
+                              columns=range(meta["ncols"]))
+            df.columns = columns
+            df.index.name = meta.get("index_name")
+
+    if kind == "index":
+        return pd.DatetimeIndex(df.index)
+    if kind == "series":
+        return df.iloc[:, 0]
+    return df
+
+
+#  ----- #
+#  Cache #
+#  ----- #
+
+class ByteLRU(object):
+    """
+    A thread safe least recently used cache of bytes values that holds
+    at most `max_bytes` bytes in total
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value  # move to most recently used
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= len(self._data.pop(key))
+            if len(value) > self.max_bytes:
+                return
+            self._data[key] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= len(self._data.popitem(last=False)[1])
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "nbytes": self.nbytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses}
+
+
+#  ------- #
+#  Loaders #
+#  ------- #
+
+def _import_from(subdir, name):
+    path = os.path.join(ROOT, subdir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return __import__(name)
+
+
+def _peaktrough():
+    return _import_from("fred", "peaktrough")
+
+
+def _load_fred(server, fred_series, start="01/01/1972"):
+    return _peaktrough()._download_fred(fred_series, start=start)
+
+
+def _load_peaks(server, start="01/01/1972"):
+    return _peaktrough().peak_begin_dates(start=start)
+
+
+def _load_cycle_panel(server, fred_series, nperiods=40, changetype="log",
+                      start="01/01/1972", freq=None, how="mean"):
+    # build on the cached series and peaks
+    data = server.call("fred", [fred_series], {"start": start})
+    peaks = server.call("peaks", [], {"start": start})
+    return _peaktrough()._cycle_panel(data, peaks, nperiods, changetype,
+                                      freq, how)
+
+
+def _version_fred(server, *args, **kwargs):
+    """
+    Changes every `server.fred_ttl` seconds, so FRED data is refreshed
+    """
+    return int(time.time() // server.fred_ttl)
+
+
+def _psid_store(server, path=None):
+    """
+    The PSID store the server reads from, checking that it is the store
+    at `path` the client asked for (if given)
+    """
+    if server.psid_store is None:
+        raise ValueError("Server was started without --psid-store")
+    if path is not None and (os.path.realpath(path) !=
+                             os.path.realpath(server.psid_store)):
+        raise ValueError("Server reads PSID data from %s, not %s"
+                         % (server.psid_store, path))
+    return server.psid_store
+
+
+def _load_psid(server, name, columns=None, path=None):
+    store_path = _psid_store(server, path)
+    if os.path.isdir(store_path):
+        psid = _import_from("psid", "psid")
+        return psid.read_wave(store_path, name, columns=columns)
+
+    store = pd.HDFStore(store_path, mode="r")
+    try:
+        return store.select(name, columns=columns)
+    finally:
+        store.close()
+
+
+def _version_psid(server, name, columns=None, path=None):
+    """
+    Something that changes whenever the data behind `_load_psid` does:
+    the catalog fingerprint of the wave, or the modification time of an
+    hdf file
+    """
+    store_path = _psid_store(server, path)
+    if os.path.isdir(store_path):
+        psid = _import_from("psid", "psid")
+        return psid.read_catalog(store_path).get(name, {}).get("sha1")
+
+    return os.path.getmtime(store_path)
+
+
+LOADERS = {"fred": _load_fred,
+           "peaks": _load_peaks,
+           "cycle_panel": _load_cycle_panel,
+           "psid": _load_psid}
+
+# Loaders whose data can change while the server runs. The version is
+# part of the cache key, so stale entries are never served
+VERSIONS = {"fred": _version_fred,
+            "peaks": _version_fred,
+            "cycle_panel": _version_fred,
+            "psid": _version_psid}
+
+
+#  ------ #
+#  Server #
+#  ------ #
+
+class PanelServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server on localhost that answers POST /call requests with
+    cached, encoded data and GET /stats with cache statistics
+    """
+    daemon_threads = True
+
+    def __init__(self, port=8765, max_bytes=1 << 30, psid_store=None,
+                 fred_ttl=6 * 3600):
+        HTTPServer.__init__(self, ("127.0.0.1", port), _Handler)
+        self.cache = ByteLRU(max_bytes)
+        self.psid_store = psid_store
+        self.fred_ttl = fred_ttl
+
+    def _load(self, fn, args, kwargs):
+        if fn not in LOADERS:
+            raise ValueError("Unknown function %s" % fn)
+        return LOADERS[fn](self, *args, **kwargs)
+
+    def call(self, fn, args, kwargs):
+        """
+        Return the decoded result of fn, going through the cache
+        """
+        return decode(self.call_encoded(fn, args, kwargs, "npz"), "npz")
+
+    def call_encoded(self, fn, args, kwargs, fmt):
+        """
+        Return the result of fn encoded with fmt, going through the cache
+        """
+        version = None
+        if fn in VERSIONS:
+            version = VERSIONS[fn](self, *args, **kwargs)
+        key = json.dumps([fn, args, kwargs, fmt, version], sort_keys=True,
+                         default=str)
+        buf = self.cache.get(key)
+        if buf is None:
+            buf = encode(self._load(fn, args, kwargs), fmt)
+            self.cache.put(key, buf)
+        return buf
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _reply(self, code, body, ctype="application/octet-stream"):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, json.dumps(self.server.cache.stats()).encode(),
+                        "application/json")
+        else:
+            self._reply(404, b"Not found", "text/plain")
+
+    def do_POST(self):
+        if self.path != "/call":
+            return self._reply(404, b"Not found", "text/plain")
+
+        try:
+            n = int(self.headers["Content-Length"])
+            req = json.loads(self.rfile.read(n).decode())
+            body = self.server.call_encoded(req["fn"], req.get("args", []),
+                                            req.get("kwargs", {}),
+                                            req.get("format", "npz"))
+        except Exception as e:
+            return self._reply(500, str(e).encode(), "text/plain")
+
+        self._reply(200, body)
+
+    def log_message(self, format, *args):
+        pass  # keep quiet
+
+
+#  ------ #
+#  Client #
+#  ------ #
+
+class PanelClient(object):
+    """
+    Thin client for a running `PanelServer`
+
+    Parameters
+    ----------
+    address : string
+        The base url of the server, e.g. http://127.0.0.1:8765
+
+    fmt : string, optional(default="npz")
+        The format to request results in. Either "npz" or "arrow"
+
+    timeout : float, optional(default=600)
+        Seconds to wait for a reply. Cold requests can be slow
+    """
+    def __init__(self, address, fmt="npz", timeout=600):
+        self.address = address.rstrip("/")
+        self.fmt = fmt
+        self.timeout = timeout
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Return the result of loader fn called with args and kwargs
+        """
+        req = json.dumps({"fn": fn, "args": args, "kwargs": kwargs,
+                          "format": self.fmt}, default=str)
+        r = urlopen(Request(self.address + "/call", data=req.encode(),
+                            headers={"Content-Type": "application/json"}),
+                    timeout=self.timeout)
+        return decode(r.read(), self.fmt)
+
+    def stats(self):
+        r = urlopen(self.address + "/stats", timeout=self.timeout)
+        return json.loads(r.read().decode())
+
+
+def get_client():
+    """
+    Return a `PanelClient` for the server named in the NYUECON_PANELSERVER
+    environment variable, or None if it isn't set
+    """
+    address = os.environ.get(ENV_VAR)
+    if not address:
+        return None
+    return PanelClient(address)
+
+
+def find_cached():
+    """
+    Return `cached` if the NYUECON_PANELSERVER environment variable is
+    set, otherwise None so callers load their data directly
+    """
+    if not os.environ.get(ENV_VAR):
+        return None
+    return cached
+
+
+def cached(fn, fallback, *args, **kwargs):
+    """
+    Call loader fn through the panel server if one is configured,
+    otherwise (or if the server can't be reached) call
+    `fallback(*args, **kwargs)` directly
+    """
+    client = get_client()
+    if client is not None:
+        try:
+            return client.call(fn, *args, **kwargs)
+        except (IOError, OSError) as e:
+            print("WARN: panel server failed (%s). Loading locally" % e)
+
+    return fallback(*args, **kwargs)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765,
+                        help="Port to listen on (localhost only)")
+    parser.add_argument("--max-mb", type=float, default=1024,
+                        help="Maximum size of the cache in megabytes")
+    parser.add_argument("--psid-store",
+                        help="PSID store directory (see psid.write_wave) "
+                             "or hdf file to serve PSID columns from")
+    parser.add_argument("--fred-ttl", type=float, default=6 * 3600,
+                        help="Seconds before FRED series, peak dates and "
+                             "cycle panels are downloaded again")
+    args = parser.parse_args()
+
+    # the loaders must not call back into this server
+    os.environ.pop(ENV_VAR, None)
+
+    server = PanelServer(port=args.port,
+                         max_bytes=int(args.max_mb * (1 << 20)),
+                         psid_store=args.psid_store,
+                         fred_ttl=args.fred_ttl)
+    print("Serving panels on http://127.0.0.1:%d" % args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
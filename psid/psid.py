@@ -8,9 +8,18 @@ use the read_csv option `usecols` to only keep what we need
 
 """
 import re
+import io
 import os
 import gc
+import json
+import time
+import hashlib
+import warnings
+import datetime
+import contextlib
+import shutil
 import os.path
+import multiprocessing
 import zipfile
 import requests
 import lxml.html
@@ -125,13 +134,15 @@ def psid_unzip(filename, extractall=False):
     return (nsas, nascii)
 
 
-def sascii2csv(sas_name, ascii_name, csv_name, remove_orig=True):
+def _read_sas_meta(sas_name):
     """
-    Read in ascii data from SAS commands and write out csv
+    Parse the variable names, labels, formats and column positions out
+    of the SAS commands that come with each PSID ascii file
     """
     # Open sas file
     x = open(sas_name, "r")
     dat = x.read()
+    x.close()
     dat_split = dat.split('\n')
 
     # RE for variable designation
@@ -170,16 +181,180 @@ def sascii2csv(sas_name, ascii_name, csv_name, remove_orig=True):
                       "l2": l2,
                       "l3": l2 - l1 + 1}]
 
+    return meta
+
+
+def _record_layout(ascii_name):
+    """
+    Return the record length (including the line terminator), the
+    number of records and the line terminator of the fixed width file
+    ascii_name
+    """
+    with open(ascii_name, "rb") as f:
+        first = f.readline()
+    reclen = len(first)
+    term = first[len(first.rstrip(b"\r\n")):]
+    nl = len(term)
+    size = os.path.getsize(ascii_name)
+
+    # the last record may be missing its line terminator
+    if size % reclen == 0:
+        nrec = size // reclen
+    elif (size + nl) % reclen == 0:
+        nrec = (size + nl) // reclen
+    else:
+        raise ValueError("%s does not have a constant record length"
+                         % ascii_name)
+
+    return reclen, nrec, term
+
+
+def _decode_field(records, l1, l2):
+    """
+    Decode columns l1 through l2 (1-based, inclusive, as in the SAS
+    commands) of every record as floats. Blank fields become NaN
+    """
+    field = np.ascontiguousarray(records[:, l1 - 1:l2])
+    field = np.char.strip(field.view("S%d" % (l2 - l1 + 1)).ravel())
+    return np.where(field == b"", b"nan", field).astype(float)
+
+
+def _filter_records(buf, reclen, term, filters):
+    """
+    Keep only the records in buf for which every (l1, l2, predicate) in
+    filters holds. Only the filtered fields are decoded
+    """
+    n = -(-len(buf) // reclen)
+    missing = n * reclen - len(buf)
+    if missing:  # the last record lacks (part of) its line terminator
+        buf += term[len(term) - missing:]
+    records = np.frombuffer(buf, dtype=np.uint8).reshape(n, reclen)
+
+    keep = np.ones(n, dtype=bool)
+    for l1, l2, pred in filters:
+        x = _decode_field(records, l1, l2)
+        if callable(pred):
+            keep &= np.asarray(pred(x), dtype=bool)
+        else:
+            lo, hi = pred
+            if lo is not None:
+                keep &= x >= lo
+            if hi is not None:
+                keep &= x <= hi
+
+    return records[keep].tobytes()
+
+
+def _convert_shard(args):
+    """
+    Parse records [start, start + nrec) of a fixed width file and write
+    them as csv. Takes a single tuple so it can be used with Pool.map
+    """
+    (ascii_name, start, nrec, reclen, term, names, lengths, out_name, header,
+     filters) = args
+
+    with open(ascii_name, "rb") as f:
+        f.seek(start * reclen)
+        buf = f.read(nrec * reclen)
+
+    if filters:
+        buf = _filter_records(buf, reclen, term, filters)
+
+    with warnings.catch_warnings():
+        # a shard with no matching records is fine
+        warnings.filterwarnings("ignore", "genfromtxt: Empty input")
+        data = np.atleast_1d(np.genfromtxt(io.BytesIO(buf), names=names,
+                                           delimiter=lengths))
+    np.savetxt(out_name, data, delimiter=',',
+               header=','.join(data.dtype.names) if header else '')
+    del data
+
+    return out_name
+
+
+def sascii2csv(sas_name, ascii_name, csv_name, remove_orig=True,
+               n_shards=1, processes=None, row_filter=None):
+    """
+    Read in ascii data from SAS commands and write out csv
+
+    Parameters
+    ----------
+    sas_name : string
+        The file name of the SAS commands describing the data
+
+    ascii_name : string
+        The file name of the fixed width ascii data
+
+    csv_name : string
+        The name of the csv file to write
+
+    remove_orig : bool, optional(default=True)
+        Whether to delete sas_name and ascii_name when done
+
+    n_shards : int, optional(default=1)
+        The number of pieces to split the ascii file into. Because every
+        record has the same length, each shard is an exact byte range of
+        the file. Shards are parsed in parallel and written to csv in
+        file order, so the output does not depend on n_shards
+
+    processes : int, optional(default=None)
+        The number of worker processes to use when n_shards > 1. The
+        default is to use every core on the machine
+
+    row_filter : dict, optional(default=None)
+        Only write records that satisfy every condition in row_filter.
+        Keys are variable names (e.g. ER30001) or labels from the SAS
+        commands. Values are either a (low, high) tuple of inclusive
+        bounds, where None means unbounded, or a function that takes an
+        array of values and returns a boolean array. The filtered fields
+        are decoded straight from their byte offsets, and only matching
+        records are parsed in full. Functions must be picklable (defined
+        at module level) when n_shards > 1
+
+    Returns
+    -------
+    None
+    """
+    meta = _read_sas_meta(sas_name)
+
     # Get relevant descriptions
     names = [z["label"] for z in meta]
     lengths = [z["l3"] for z in meta]
+
+    filters = []
+    for key, pred in (row_filter or {}).items():
+        z = [m for m in meta if key in (m["variable"], m["label"])]
+        if len(z) == 0:
+            raise ValueError("Unknown variable %s in row_filter" % key)
+        filters.append((z[0]["l1"], z[0]["l2"], pred))
     del meta
 
+    reclen, nrec, term = _record_layout(ascii_name)
+    bounds = np.linspace(0, nrec, max(n_shards, 1) + 1).astype(int)
+    bounds = np.unique(bounds)
+
     # Use numpy to read fixed width file and write as .csv
-    data = np.genfromtxt(ascii_name, names=names, delimiter=lengths)
-    np.savetxt(csv_name, data, delimiter=',',
-               header=','.join(data.dtype.names))
-    del data
+    if len(bounds) <= 2:
+        _convert_shard((ascii_name, 0, nrec, reclen, term, names, lengths,
+                        csv_name, True, filters))
+    else:
+        tasks = [(ascii_name, b0, b1 - b0, reclen, term, names, lengths,
+                  "%s.part%04d" % (csv_name, i), i == 0, filters)
+                 for i, (b0, b1) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            parts = pool.map(_convert_shard, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        # stitch the pieces together in file order
+        with open(csv_name, "wb") as out:
+            for part in parts:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(part)
 
     if remove_orig:
         os.remove(sas_name)
@@ -187,7 +362,8 @@ def sascii2csv(sas_name, ascii_name, csv_name, remove_orig=True):
 
 
 def download_unzip_csv_psid(f_name, request_num, session, to_csv=True,
-                            remove_orig=True, verbose=True):
+                            remove_orig=True, verbose=True, n_shards=1,
+                            processes=None, row_filter=None):
     """
     Download a family data set
     """
@@ -209,7 +385,9 @@ def download_unzip_csv_psid(f_name, request_num, session, to_csv=True,
 
         # generate csv_name and convert to csv
         csv_name = f_name.strip(".zip") + ".csv"
-        sascii2csv(sas_name, ascii_name, csv_name, remove_orig=remove_orig)
+        sascii2csv(sas_name, ascii_name, csv_name, remove_orig=remove_orig,
+                   n_shards=n_shards, processes=processes,
+                   row_filter=row_filter)
 
     if remove_orig:
         os.remove(f_name)
@@ -221,7 +399,8 @@ def download_all_family_data(session, to_csv=True, **kwargs):
     """
     Download all family data sets
     """
-    for (fy, rn) in file_lookup.copy().pop("ind").items():
+    for (fy, rn) in dict((k, v) for k, v in file_lookup.items()
+                         if k != "ind").items():
         fn = "FAM" + fy + ".zip"
         download_unzip_csv_psid(fn, rn, session, to_csv=to_csv, **kwargs)
 
@@ -272,14 +451,90 @@ def clean_indfile_names(df):
 
     """
     cols = pd.Series(df.columns, dtype=str)
-    c2 = cols.str.extract("(.+?)__+(\d\d)")
+    c2 = cols.str.extract(r"(.+?)__+(\d\d)$")
     cols2 = c2[0] + c2[1]
     cols2 = cols2.fillna(cols)
-    df.cols = cols2
+    df.columns = cols2
 
     return df
 
 
+def indfile_to_long(df):
+    """
+    Reshape the wide cross-year individual file into a long person x
+    year layout.
+
+    Columns of the form `VAR__YY` are split into the variable `VAR` and
+    the year `YY`, and columns of the form `YYYY_VAR` (such as
+    `1970_INTERVIEW_NUMBER`) into the variable `VAR` and the year
+    `YYYY`. Columns prefixed with 1968 (`1968_INTERVIEW_NUMBER`,
+    `1968_ID_OF_FATHER`, ...) are the permanent 1968 family identifiers,
+    so they are kept with every other column (person identifiers and
+    the like) that is repeated for each year. The reshape is a single
+    numpy gather driven by the parsed years, rather than a melt per
+    variable.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The individual file, as read from the csv written by
+        `sascii2csv`
+
+    Returns
+    -------
+    long_df : pd.DataFrame
+        A DataFrame with one row per person and year, sorted by year,
+        with the identifier columns, a `year` column (four digits) and
+        one column per variable. Variables not collected in a year are
+        NaN
+
+    """
+    cols = pd.Series(df.columns, dtype=str)
+    suffix = cols.str.extract(r"(.+?)__+(\d\d)$")
+    prefix = cols.str.extract(r"^(\d{4})_(.+)$")
+    prefix = prefix[prefix[0] != "1968"]
+
+    yy = suffix[1].astype(float)
+    yrs = yy + np.where(yy >= 68, 1900, 2000)  # PSID starts in 1968
+    yrs = yrs.fillna(prefix[0].astype(float))
+    var = suffix[0].fillna(prefix[1])
+
+    has_year = yrs.notnull().values
+    id_cols = list(df.columns[~has_year])
+    var = var.values[has_year]
+    yrs = yrs.values[has_year].astype(int)
+
+    variables = list(pd.unique(var))
+    years = np.unique(yrs)
+    var_code = pd.Index(variables).get_indexer(var)
+    year_code = np.searchsorted(years, yrs)
+
+    # two columns for the same variable and year would overwrite each other
+    pair = year_code * len(variables) + var_code
+    if np.unique(pair).size < pair.size:
+        dups = cols[has_year][pd.Series(pair).duplicated(keep=False).values]
+        raise ValueError("Columns parse to the same variable and year: %s"
+                         % ", ".join(dups))
+
+    # (variable, year) -> column of df, pointing missing pairs at an extra
+    # column of NaN
+    values = df.values[:, np.flatnonzero(has_year)].astype(float)
+    values = np.column_stack([values, np.nan * np.ones(len(df))])
+    col_idx = np.empty((len(years), len(variables)), dtype=int)
+    col_idx.fill(values.shape[1] - 1)
+    col_idx[year_code, var_code] = np.arange(has_year.sum())
+
+    # (year, person, variable) -> (year * person, variable)
+    wide = values[:, col_idx].transpose(1, 0, 2)
+    long_df = pd.DataFrame(wide.reshape(-1, len(variables)),
+                           columns=variables)
+    for c in id_cols[::-1]:
+        long_df.insert(0, c, np.tile(df[c].values, len(years)))
+    long_df.insert(len(id_cols), "year", np.repeat(years, len(df)))
+
+    return long_df
+
+
 def csv2hdf(csv_fn, hdf_fn, hdf_gn=None, hdf_mode="a",
             extra_func=None):
     """
@@ -339,6 +594,320 @@ def csv2hdf(csv_fn, hdf_fn, hdf_gn=None, hdf_mode="a",
     return
 
 
+def csv2hdf_long(csv_fn, hdf_fn, hdf_gn=None, hdf_mode="a"):
+    """
+    Move the cross-year individual file csv_fn to an HDF file in long
+    person x year format, partitioned by year.
+
+    Each year is stored as its own dataset `hdf_gn_yYYYY` (the same
+    names `csv2store(long=True)` gives its waves) so a query for a few
+    years only reads those partitions.
+
+    Parameters
+    ----------
+    csv_fn : string
+        The file name for the csv
+
+    hdf_fn: string
+        The name of the hdf file to write to
+
+    hdf_gn: string, optional
+        A string specifying the prefix of the partitions' names. If
+        none is given, they are saved as `/fn_long_yYYYY`, where fn is
+        the root of csv_fn
+
+    hdf_mode: string, optional(default="a")
+        The open mode for the hdf file. Default is append
+
+    Returns
+    -------
+    None
+
+    """
+    df = indfile_to_long(pd.read_csv(csv_fn))
+
+    if hdf_gn is None:
+        hdf_gn = os.path.split(csv_fn)[1][:-4] + "_long"
+
+    nyears = 0
+    for yr, part in _year_partitions(df):
+        gn = "%s_y%d" % (hdf_gn, yr)
+        try:
+            part.to_hdf(hdf_fn, key=gn, mode=hdf_mode, format="table",
+                        complib="blosc")
+        except:
+            print("WARN: Couldn't store %s as table. Using fixed" % gn)
+            part.to_hdf(hdf_fn, key=gn, mode=hdf_mode, format="fixed",
+                        complib="blosc")
+        hdf_mode = "a"  # don't wipe the partitions we just wrote
+        nyears += 1
+
+    print("Added %d yearly partitions of %s to %s" % (nyears, hdf_gn,
+                                                     hdf_fn))
+
+    return
+
+
+def _year_partitions(long_df):
+    """
+    Yield (year, DataFrame) for each year in the output of
+    `indfile_to_long`. Rows are sorted by year, so each partition is a
+    contiguous block
+    """
+    years, starts = np.unique(long_df["year"].values, return_index=True)
+    ends = np.append(starts[1:], len(long_df))
+    for yr, i0, i1 in zip(years, starts, ends):
+        yield yr, long_df.iloc[i0:i1]
+
+
+#  ------- #
+#  Storage #
+#  ------- #
+
+# A store is a directory holding one hdf file per wave and a catalog,
+# catalog.json, describing every wave that has been completely written.
+# Waves are written to a temporary file and renamed into place, and the
+# catalog is updated under a lock and also renamed into place, so any
+# number of converters can write different waves at once while readers
+# only ever see finished files.
+
+CATALOG = "catalog.json"
+
+
+def _fingerprint(fn, chunk_size=1 << 20):
+    """
+    Return the sha1 hex digest of the file fn
+    """
+    h = hashlib.sha1()
+    with open(fn, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_catalog(store_dir):
+    """
+    Return the catalog of store_dir as a dict mapping wave names to
+    their metadata. Empty if nothing has been written yet
+    """
+    fn = os.path.join(store_dir, CATALOG)
+    if not os.path.exists(fn):
+        return {}
+    with open(fn, "r") as f:
+        return json.load(f)
+
+
+@contextlib.contextmanager
+def _catalog_lock(store_dir, timeout=60):
+    """
+    Hold an exclusive lock on the catalog of store_dir. Uses flock where
+    it is available and otherwise an exclusively created lock file
+    """
+    lock_fn = os.path.join(store_dir, CATALOG + ".lock")
+
+    try:
+        import fcntl
+    except ImportError:  # not POSIX (e.g. Windows)
+        fcntl = None
+
+    if fcntl is not None:
+        with open(lock_fn, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_fn, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise IOError("Timed out waiting for %s. Remove it if no "
+                              "other process is writing" % lock_fn)
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_fn)
+
+
+def _update_catalog(store_dir, name, entry):
+    """
+    Add or replace the catalog entry for wave name
+    """
+    with _catalog_lock(store_dir):
+        catalog = read_catalog(store_dir)
+        catalog[name] = entry
+        tmp = os.path.join(store_dir, ".%s.%d.tmp" % (CATALOG, os.getpid()))
+        with open(tmp, "w") as f:
+            json.dump(catalog, f, indent=1, sort_keys=True)
+        os.replace(tmp, os.path.join(store_dir, CATALOG))
+
+
+def write_wave(df, store_dir, name):
+    """
+    Write df as wave `name` of the store in store_dir and record it in
+    the catalog.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The data for the wave
+
+    store_dir : string
+        The directory holding the store. Created if it doesn't exist
+
+    name : string
+        The name of the wave, e.g. FAM1970. The data is saved to
+        `store_dir/name.hdf`
+
+    Returns
+    -------
+    entry : dict
+        The catalog entry for the wave
+
+    Notes
+    -----
+    Like `csv2hdf`, this tries to write the data set in table form and
+    falls back to fixed form if it cannot.
+
+    """
+    if not os.path.exists(store_dir):
+        try:
+            os.makedirs(store_dir)
+        except OSError:  # another writer beat us to it
+            pass
+
+    fn = name + ".hdf"
+    tmp = os.path.join(store_dir, ".%s.%d.tmp" % (fn, os.getpid()))
+
+    try:
+        df.to_hdf(tmp, key=name, mode="w", format="table", complib="blosc")
+        fmt = "table"
+    except:
+        print("WARN: Couldn't store %s as table. Using fixed" % name)
+        df.to_hdf(tmp, key=name, mode="w", format="fixed", complib="blosc")
+        fmt = "fixed"
+
+    entry = {"file": fn,
+             "format": fmt,
+             "columns": [str(c) for c in df.columns],
+             "dtypes": [str(d) for d in df.dtypes],
+             "nrows": len(df),
+             "sha1": _fingerprint(tmp),
+             "written": datetime.datetime.now().isoformat()}
+
+    os.replace(tmp, os.path.join(store_dir, fn))
+    _update_catalog(store_dir, name, entry)
+    print("Added %s to %s" % (name, store_dir))
+
+    return entry
+
+
+def read_wave(store_dir, name, columns=None, verify=False):
+    """
+    Read wave `name` from the store in store_dir. Only waves listed in
+    the catalog (i.e. completely written) can be read.
+
+    Parameters
+    ----------
+    store_dir : string
+        The directory holding the store
+
+    name : string
+        The name of the wave, e.g. FAM1970
+
+    columns : list, optional(default=None)
+        The columns to read. Default is all of them
+
+    verify : bool, optional(default=False)
+        Whether to check the file against the fingerprint in the catalog
+        before reading it
+
+    Returns
+    -------
+    df : pd.DataFrame
+        The data for the wave
+
+    """
+    catalog = read_catalog(store_dir)
+    if name not in catalog:
+        raise ValueError("%s is not (yet) in the store %s" % (name, store_dir))
+
+    entry = catalog[name]
+    fn = os.path.join(store_dir, entry["file"])
+    if verify and _fingerprint(fn) != entry["sha1"]:
+        raise ValueError("%s does not match its catalog fingerprint" % fn)
+
+    if entry["format"] == "table":
+        return pd.read_hdf(fn, name, columns=columns)
+
+    df = pd.read_hdf(fn, name)
+    return df if columns is None else df[list(columns)]
+
+
+def csv2store(csv_fn, store_dir, name=None, extra_func=None, long=False):
+    """
+    Move the file csv_fn into the store in store_dir.
+
+    Parameters
+    ----------
+    csv_fn : string
+        The file name for the csv
+
+    store_dir : string
+        The directory holding the store
+
+    name : string, optional
+        The name of the wave. If none is given, the root of csv_fn is
+        used
+
+    extra_func: function, optional(default=None)
+        An extra function the user can supply to clean or otherwise
+        alter the data set after reading in from csv, but before saving
+
+    long : bool, optional(default=False)
+        If True, csv_fn is the cross-year individual file and is
+        stored in long format (see `indfile_to_long`) with one wave per
+        year, named `name_long_yYYYY`, instead
+
+    Returns
+    -------
+    None
+
+    """
+    df = pd.read_csv(csv_fn)
+
+    if name is None:
+        name = os.path.split(csv_fn)[1][:-4]
+
+    if long:
+        for yr, part in _year_partitions(indfile_to_long(df)):
+            write_wave(part, store_dir, "%s_long_y%d" % (name, yr))
+        return
+
+    if extra_func is not None:
+        df = extra_func(df)
+
+    write_wave(df, store_dir, name)
+
+    return
+
+
+def _csv2store_worker(args):
+    """
+    Unpack args and call csv2store, so it can be used with Pool.map
+    """
+    csv_fn, store_dir, kwargs = args
+    csv2store(csv_fn, store_dir, **kwargs)
+    return csv_fn
+
+
 def _convert_to_4_digit_year(yr):
     print("recieved yr: %s" % yr)
     if len(yr) == 4:
@@ -381,6 +950,19 @@ if __name__ == '__main__':
     parser.add_argument("--hdf",
                         help="Convert csv files to hdf named PSID.hdf",
                         action="store_true")
+    parser.add_argument("--store",
+                        help="Convert csv files to a store in directory "
+                             "STORE, with one hdf file per wave and a "
+                             "catalog. Files are converted in parallel")
+    parser.add_argument("--long",
+                        help="With --hdf or --store, also store the "
+                             "individual file in long person x year format, "
+                             "partitioned by year",
+                        action="store_true")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of processes used to convert each "
+                             "file to csv (default: number of cores)")
     parser.add_argument("-u", "--username",
                         help="Specify username for PSID website")
     parser.add_argument("-p", "--password",
@@ -406,13 +988,16 @@ if __name__ == '__main__':
         session = start_psid_session(user=args.username,
                                      password=args.password)
         if a.startswith("a"):  # download all
-            download_all_data(session)
+            download_all_data(session, n_shards=args.jobs,
+                              processes=args.jobs)
 
         elif a.startswith("i"):  # download individual file
-            download_ind_cross_year(session, to_csv=True)
+            download_ind_cross_year(session, to_csv=True,
+                                    n_shards=args.jobs, processes=args.jobs)
 
         elif a.startswith("p"):  # download parent id file
-            download_parentfile(session, to_csv=True)
+            download_parentfile(session, to_csv=True, n_shards=args.jobs,
+                                processes=args.jobs)
 
         else:
             # download single family file
@@ -422,7 +1007,9 @@ if __name__ == '__main__':
                 yr = _convert_to_4_digit_year(yr)
                 rn = file_lookup[yr]
                 fn = "FAM" + yr + ".zip"
-                download_unzip_csv_psid(fn, rn, session, to_csv=True)
+                download_unzip_csv_psid(fn, rn, session, to_csv=True,
+                                        n_shards=args.jobs,
+                                        processes=args.jobs)
             else:
                 raise ValueError("Could not parse download option")
 
@@ -431,7 +1018,28 @@ if __name__ == '__main__':
         fnames = glob.glob("./*.csv")  # get csv file names.
         fnames.sort(reverse=True)  # Sorting to put IND file at top
         for f in fnames:
-            if f.lower().startswith("ind"):
+            if os.path.basename(f).lower().startswith("ind"):
                 csv2hdf(f, "PSID.hdf", extra_func=clean_indfile_names)
+                if args.long:
+                    csv2hdf_long(f, "PSID.hdf")
             else:
                 csv2hdf(f, "PSID.hdf")
+
+    # Handle store arg
+    if args.store:
+        tasks = []
+        for f in sorted(glob.glob("./*.csv")):
+            if os.path.basename(f).lower().startswith("ind"):
+                tasks.append((f, args.store,
+                              {"extra_func": clean_indfile_names}))
+                if args.long:
+                    tasks.append((f, args.store, {"long": True}))
+            else:
+                tasks.append((f, args.store, {}))
+
+        pool = multiprocessing.Pool(args.jobs)
+        try:
+            pool.map(_csv2store_worker, tasks)
+        finally:
+            pool.close()
+            pool.join()
@@ -6,10 +6,17 @@ macro course
 @date : 2015-02-04 16:57:38
 
 """
+import os
 import numpy as np
 import pandas as pd
 import statsmodels.formula.api as sm
 
+try:
+    from panelserver import find_cached
+    cached = find_cached()
+except ImportError:  # panelserver.py (repo root) isn't on the path
+    cached = None
+
 pd.set_option("use_inf_as_null", True, "display.width", 180)
 
 cols70 = {"1970_INT_": "INT_1970",        # (V1102)
@@ -45,7 +52,16 @@ def get_store(fn="/Users/sglyon/DataSets/PSID/PSID.hdf", mode="r"):
 
 
 def get_psid_file(store, fn, cols, rename_dict):
-    df = store.select(fn, columns=cols)
+    # go through the panel server's cache if one is running
+    if cached is None:
+        df = store.select(fn, columns=cols)
+    else:
+        # the server only answers for the store it was started with
+        df = cached("psid",
+                    lambda fn, columns, path: store.select(fn,
+                                                           columns=columns),
+                    fn, columns=list(cols),
+                    path=os.path.abspath(store.filename))
     df.rename(columns=rename_dict, inplace=True)
     return df
 
@@ -74,6 +90,24 @@ def get_f95(cols=cols95.keys(), rename_dict=cols95, store=get_store()):
     return out
 
 
+def get_ind_long(years, cols=None, store=get_store()):
+    """
+    Read only the given years of the long format individual file, from
+    an HDFStore written by `psid.csv2hdf_long` or, if `store` is a path,
+    from a store directory written by `psid.csv2store(long=True)`
+    """
+    names = ["IND2011ER_long_y%d" % yr for yr in years]
+    if isinstance(store, str):
+        from psid import read_wave
+        return pd.concat([read_wave(store, n, columns=cols) for n in names],
+                         ignore_index=True)
+
+    out = pd.concat([store.select(n, columns=cols) for n in names],
+                    ignore_index=True)
+    store.close()
+    return out
+
+
 def set_FN_PN_index(df, sort=True, inplace=True):
     if inplace:
         df.set_index(["FN", "PN"], inplace=True)